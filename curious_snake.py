@@ -238,17 +238,13 @@ def evaluate_learner_with_holdout(learner, num_labels, test_sets):
     results={"size":num_labels}
     print "evaluating learner over %s instances." % len(learner.unlabeled_datasets[0].instances)
     fns = 0
-    predictions = []
     point_sets = [dataset.get_samples() for dataset in test_sets]
     # the labels are assumed to be the same; thus we only use the labels for the first dataset
     true_labels = test_sets[0].get_labels()
    
-    # loop over all of the examples, and feed to the predict method 
-    # the corresponding point in each feature-space
-    for example_index in range(len(point_sets[0])):
-        # hand the predict method a list of representations of x; one per feature space/model
-        prediction = learner.predict([point_sets[feature_space_index][example_index] for feature_space_index in range(len(point_sets))])
-        predictions.append(prediction)
+    # hand the predict method, for each example, a list of representations of x; one per feature space/model.
+    # the examples are predicted in one batch (see predict_batch in base_learner).
+    predictions = learner.predict_batch(zip(*point_sets))
     
     conf_mat =  _evaluate_predictions(predictions, true_labels)
     _calculate_metrics(conf_mat, results)
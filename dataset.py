@@ -9,6 +9,7 @@
 
 import pdb
 import random 
+import numpy
 
 def build_dataset_from_file(fpath, ids_in_file=False, name=""):
     '''
@@ -93,6 +94,9 @@ class Dataset:
         self.instances = instances or dict({})
         assert(isinstance(self.instances, dict))
         self.name = name
+        # dense copy of the points; built lazily by get_point_matrix and 
+        # discarded whenever instances are added or removed
+        self._point_matrix = None
 
     def size(self):
         if self.instances is not None:
@@ -102,6 +106,7 @@ class Dataset:
 
     def remove_instances(self, ids_to_remove):
         ''' Remove and return the instances with ids in ids_to_remove '''
+        self._point_matrix = None
         return [self.instances.pop(id) for id in ids_to_remove]
 
     def copy(self):
@@ -123,8 +128,7 @@ class Dataset:
         if len(majority_ids) < n:
             raise Exception, "you asked me to remove more (majority) instances than I have!"
         remove_these = random.sample(majority_ids, n)
-        for inst_id in remove_these:
-            self.instances.pop(inst_id)         
+        self.remove_instances(remove_these)
         return remove_these
 
 
@@ -132,8 +136,9 @@ class Dataset:
         '''
         Adds every instance in the instances list to this dataset.
         '''
+        self._point_matrix = None
         for inst in instances_to_add:
-            if inst.id in self.instances.keys():
+            if inst.id in self.instances:
                 raise Exception, "dataset.py: error adding instances; duplicate instance ids!"
             self.instances[inst.id] = inst
 
@@ -199,7 +204,7 @@ class Dataset:
         '''
         Counts and returns the number of minority examples in this dataset.
         '''
-        return len(self.get_minority_examples())
+        return len([inst for inst in self.instances.itervalues() if inst.label == self.minority_class])
 
     def get_instance_ids(self):
         return self.instances.keys()
@@ -231,6 +236,23 @@ class Dataset:
         return [inst.label for inst in self.instances.values()]
 
 
+    def get_point_matrix(self):
+        '''
+        Returns a tuple (X, sq_norms, row_for_id). X is a dense matrix with a row for each
+        instance (column j holds dimension j of its point), sq_norms holds the squared norm of
+        each row and row_for_id maps instance ids to rows. This is cached until the dataset
+        is next modified.
+        '''
+        if self._point_matrix is None:
+            ids = self.instances.keys()
+            width = 1 + max([max(self.instances[id].point.keys() or [0]) for id in ids] or [0])
+            X = numpy.zeros((len(ids), width))
+            for row, id in enumerate(ids):
+                for dim, value in self.instances[id].point.items():
+                    X[row, dim] = value
+            self._point_matrix = (X, (X*X).sum(axis=1), dict(zip(ids, range(len(ids)))))
+        return self._point_matrix
+
     def get_samples_and_labels_for_ids(self, ids):
         samples, labels = [], []
         for id in ids:
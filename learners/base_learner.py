@@ -16,6 +16,7 @@ import random
 import math
 import dataset 
 import numpy
+from multiprocessing.pool import ThreadPool
 
 class BaseLearner(object):
     '''
@@ -65,14 +66,30 @@ class BaseLearner(object):
 
  
     
-    def active_learn(self, num_examples_to_label, batch_size=5):
+    def active_learn(self, num_examples_to_label, batch_size=5, rebuild_every=None, rebuild_in_background=False):
         '''
         Core active learning routine. Here the learner uses its query function to select a number of examples 
         (num_to_label_at_each_iteration) to label at each step, until the total number of examples requested 
-        (num_examples_to_label) has been labeled. The models will be updated at each iteration.
+        (num_examples_to_label) has been labeled. The models will be updated at each iteration, or, if
+        rebuild_every is given, once at least that many examples have been labeled since they were last rebuilt.
+
+        If rebuild_in_background is True, the models are trained on a separate thread while the query function
+        goes on selecting examples with the current models; these are swapped out once the new ones are ready.
+        (This pays off when training releases the GIL, as libsvm does.) The training data is read from the 
+        labeled datasets before the thread starts (see _prepare_rebuild), so labeling more examples meanwhile
+        doesn't affect it. In any case, the models are up-to-date when this returns.
         '''
         labeled_so_far = 0
+        labeled_since_rebuild = 0
+        pool = ThreadPool(1) if rebuild_in_background else None
+        # the pending (background) training, if any; an AsyncResult holding the new models
+        rebuilding = None
         while labeled_so_far < num_examples_to_label:
+            if rebuilding is not None and rebuilding.ready():
+                # get re-raises anything raised while training
+                self._finish_rebuild(rebuilding.get())
+                rebuilding = None
+
             example_ids_to_label = self.query_function(batch_size)
             # now remove the selected examples from the unlabeled sets and put them in the labeled sets.
             # if not ids are returned -- ie., if a void query_function is used --
@@ -80,12 +97,28 @@ class BaseLearner(object):
             if example_ids_to_label:
                 self.label_instances_in_all_datasets(example_ids_to_label)
 
-            if self.rebuild_models_at_each_iter:
-                self.rebuild_models()   
-
             labeled_so_far += batch_size
+            labeled_since_rebuild += batch_size
 
-        self.rebuild_models()
+            if self.rebuild_models_at_each_iter and labeled_since_rebuild >= (rebuild_every or batch_size):
+                if rebuilding is not None:
+                    # wait for the previous rebuild to finish
+                    self._finish_rebuild(rebuilding.get())
+                if pool is not None:
+                    rebuilding = pool.apply_async(self._prepare_rebuild())
+                else:
+                    self.rebuild_models()   
+                labeled_since_rebuild = 0
+
+        if pool is not None:
+            if rebuilding is not None:
+                self._finish_rebuild(rebuilding.get())
+            pool.close()
+            pool.join()
+
+        # no need to rebuild again if the models were just rebuilt (at the last iteration)
+        if labeled_since_rebuild or not labeled_so_far:
+            self.rebuild_models()
             
     
     def predict(self, X):
@@ -102,26 +135,66 @@ class BaseLearner(object):
         If there are multiple models built over different feature spaces, this predicts a label for an instance based on the
         majority vote of these classifiers -- otherwise this is simply "predict"
         '''
-        votes = []
         if self.models and len(self.models) > 0:
-            for m,x in zip(self.models, X):
-                votes.append(m.predict(x))
-            vote_set = list(set(votes))
-            count_in_list = lambda x: votes.count(x)
-            return vote_set[_arg_max(vote_set, count_in_list)]
+            votes = numpy.fromiter((m.predict(x) for m,x in zip(self.models, X)), dtype=numpy.int32)
+            # bincount only tallies non-negative ints, so shift the labels (e.g., -1/1) up by the smallest vote
+            offset = votes.min()
+            return int(numpy.bincount(votes - offset).argmax()) + int(offset)
         else:
             raise Exception, "No models have been initialized."
 
+    def predict_batch(self, X_list):
+        '''
+        Predicts labels for a list of examples, each formatted as for predict (i.e., a list of 
+        representations of the example, one per feature space). With the default (majority vote)
+        prediction function, each model is run over all of the examples and the votes are then
+        tallied at once; other prediction functions are simply called once per example. Either way,
+        the labels are returned as ints, as majority_predict returns them.
+        '''
+        if self.predict != self.majority_predict:
+            return [int(self.predict(X)) for X in X_list]
+        if not (self.models and len(self.models) > 0):
+            raise Exception, "No models have been initialized."
+        if not len(X_list):
+            return []
+        # votes[i, j] is the label predicted for example i by model j
+        votes = numpy.array([[m.predict(X[j]) for X in X_list] for j, m in enumerate(self.models)], dtype=numpy.int32).T
+        offset = votes.min()
+        n_labels = votes.max() - offset + 1
+        # a single bincount over all of the examples: the votes for example i land in bins [i*n_labels, (i+1)*n_labels)
+        bins = (votes - offset) + n_labels * numpy.arange(len(votes))[:, numpy.newaxis]
+        counts = numpy.bincount(bins.ravel(), minlength=len(votes)*n_labels).reshape(len(votes), n_labels)
+        return [int(l) + int(offset) for l in counts.argmax(axis=1)]
+
     def cautious_predict(self, X):
         '''
         A naive way of combining different models (built over different feature-spaces); if any othe models vote yes, then vote yes.
         When there is only on feature space, this reduces to simply "predict".
         '''
         if self.models and len(self.models):
-            return max([m.predict(x) for m,x in zip(self.models, X)])
+            votes = []
+            for m,x in zip(self.models, X):
+                vote = m.predict(x)
+                # no need to consult the remaining models once one has voted yes (i.e., for the minority class)
+                if vote == dataset.Dataset.minority_class:
+                    return vote
+                votes.append(vote)
+            return max(votes)
         else:
             raise Exception, "No models have been initialized."
                 
+    def _top_k(self, scores, k):
+        '''
+        Returns the indices of the k largest entries in the array scores, from largest to smallest. 
+        Query functions that score every unlabeled instance can use this to pick their k best in
+        linear time (via a partial sort) rather than by repeatedly scanning for the maximum.
+        '''
+        k = min(k, len(scores))
+        if k <= 0:
+            return numpy.array([], dtype=int)
+        top = numpy.argpartition(-scores, k-1)[:k]
+        return top[numpy.argsort(-scores[top])]
+
     def base_q_function(self, k):
         ''' overwite this method with query function of choice (e.g., SIMPLE) '''
         raise Exception, "no query function provided!"
@@ -131,7 +204,7 @@ class BaseLearner(object):
         '''
         Labels all the examples in the training set
         '''
-        inst_ids = [inst.id for inst in self.unlabeled_datasets[0].instances]
+        inst_ids = self.unlabeled_datasets[0].get_instance_ids()
         self.label_instances_in_all_datasets(inst_ids)
         
         
@@ -169,15 +242,18 @@ class BaseLearner(object):
         undersampled datasets. Thus it *does not mutate the labeled datasets*.
         '''
         if self.labeled_datasets and len(self.labeled_datasets) and (len(self.labeled_datasets[0].instances) > 0):
+            # count each class once; each count is a pass over the labeled data
+            num_minority = self.labeled_datasets[0].number_of_minority_examples()
+            num_majority = len(self.labeled_datasets[0]) - num_minority
             if k is None:
                 print "undersampling majority class to equal that of the minority examples"
-                k = self.labeled_datasets[0].number_of_majority_examples() - self.labeled_datasets[0].number_of_minority_examples()
+                k = num_majority - num_minority
             # we copy the datasets rather than mutate the class members.
             copied_datasets = [d.copy() for d in self.labeled_datasets]
-            if k < self.labeled_datasets[0].number_of_majority_examples() and k > 0:
+            if k < num_majority and k > 0:
                 # make sure we have enough majority examples...
                 print "removing %s majority instances. there are %s total majority examples in the dataset." % \
-                        (k, self.labeled_datasets[0].number_of_majority_examples())
+                        (k, num_majority)
                 removed_instance_ids = copied_datasets[0].undersample(k)
                 # if there is more than one feature-space, remove the same 
                 # instances from the remaining spaces (sets)
@@ -195,30 +271,35 @@ class BaseLearner(object):
     def rebuild_models(self, undersample_first=False):
         raise Exception, "No models provided! (BaseLearner)"
 
+    def _prepare_rebuild(self, for_eval=False):
+        '''
+        Splits rebuild_models in two, for rebuilding on another thread: this reads everything needed
+        for training from the labeled datasets, and returns a function that trains and returns the new 
+        models from that snapshot without touching the learner. Its result goes to _finish_rebuild,
+        which installs the models. Override both to train in the background; by default, the whole 
+        rebuild happens here.
+        '''
+        self.rebuild_models(for_eval)
+        models = self.models
+        return lambda: models
+
+    def _finish_rebuild(self, models):
+        self.models = models
+
     def write_out_labeled_data(self, path, dindex=0):
         outf = open(path, 'w')
         outf.write(self.labeled_datasets[dindex].get_points_str())
         outf.close()
 
     def unlabel_instances(self, inst_ids):
-        for inst_index in range(len(self.labeled_datasets[0].instances)):
-            if self.labeled_datasets[0].instances[inst_index].id in inst_ids:
-                for unlabeled_dataset, labeled_dataset in zip(self.unlabeled_datasets, self.labeled_datasets):
-                    labeled_dataset.instances[inst_index].lbl = labeled_dataset.instances[inst_index].label
-                    labeled_dataset.instances[inst_index].has_synthetic_label = False
-
-        # now remove the instances and place them into the unlabeled set
+        # the instances are keyed by id, so we look them up directly rather than scanning the labeled set;
+        # ids that aren't in the labeled set are skipped
         for unlabeled_dataset, labeled_dataset in zip(self.unlabeled_datasets, self.labeled_datasets):
-            unlabeled_dataset.add_instances(labeled_dataset.remove_instances(inst_ids))
-
-def _arg_max(ls, f):
-    ''' Returns the index for x in ls for which f(x) is maximal w.r.t. the rest of the list '''
-    return_index = 0
-    max_val = f(ls[0])
-    for i in range(len(ls)-1):
-        if f(ls[i+1]) > max_val:
-            return_index = i
-            max_val = f(ls[i+1])
-    return return_index
-
-        
\ No newline at end of file
+            labeled_ids = [inst_id for inst_id in inst_ids if inst_id in labeled_dataset.instances]
+            for inst_id in labeled_ids:
+                inst = labeled_dataset.instances[inst_id]
+                inst.lbl = inst.label
+                inst.has_synthetic_label = False
+
+            # now remove the instances and place them into the unlabeled set
+            unlabeled_dataset.add_instances(labeled_dataset.remove_instances(labeled_ids))
@@ -15,6 +15,8 @@
 import os
 import sys
 import pdb
+import numpy
+from multiprocessing.pool import ThreadPool
 
 #
 # Here we explicitly append the path to libsvm; is there a better way to do this?
@@ -38,11 +40,25 @@ class BaseSVMLearner(BaseLearner):
         # *you'll probably want to overwrite this* in your subclass. see the libsvm doc for more information (in particular,
         # svm_test.py is helpful).
         self.params = [svm_parameter()  for d in unlabeled_datasets]
-        self.div_hash = {}
+        # memoized pairwise kernel values (distances, cosines). these depend only on the kernel
+        # settings of the models -- not the models themselves -- so they're kept across rebuilds
+        # unless those settings change.
+        self._clear_kernel_caches()
+        self.cache_kernels = None
+        # the points converted to libsvm's format, per feature space; these are reused
+        # every time the models are rebuilt rather than converted anew
+        self.node_caches = [svm_node_cache() for d in unlabeled_datasets]
         
         
     def rebuild_models(self, for_eval=False):
         ''' Rebuilds all models over the current labeled datasets. '''
+        self._finish_rebuild(self._prepare_rebuild(for_eval)())
+
+    def _prepare_rebuild(self, for_eval=False):
+        ''' 
+        Builds the svm_problems over the current labeled datasets and returns a function training
+        the models over these (see BaseLearner._prepare_rebuild).
+        '''
         datasets = self.labeled_datasets
         # we assume here -- as it's the typical thing to do --
         # that if you are undersampling, you only want to do so 
@@ -53,32 +69,72 @@ class BaseSVMLearner(BaseLearner):
         
         print "training model(s) on %s instances" % len(datasets[0].instances)
         
-        self.models = []
-        for dataset, param in zip(datasets, self.params):
-            samples, labels = dataset.get_samples_and_labels()
-            problem = svm_problem(labels, samples)
-            self.models.append(svm_model(problem, param))
+        problems = []
+        for dataset, node_cache in zip(datasets, self.node_caches):
+            instances = dataset.instances.values()
+            problems.append(svm_problem([inst.label for inst in instances], [inst.point for inst in instances],
+                                            node_cache=node_cache, keys=[inst.id for inst in instances]))
+        to_train = zip(problems, self.params)
+
+        def train():
+            if len(to_train) == 1:
+                return map(_train_model, to_train)
+            # libsvm releases the GIL while training (see svmc.i), so we train the models for
+            # the different feature spaces concurrently
+            pool = ThreadPool(len(to_train))
+            try:
+                return pool.map(_train_model, to_train)
+            finally:
+                pool.close()
+                pool.join()
+        return train
+
+    def _finish_rebuild(self, models):
+        self.models = models
+        kernels = [model.kernel for model in self.models]
+        if kernels != self.cache_kernels:
+            self._clear_kernel_caches()
+            self.cache_kernels = kernels
         print "models rebuilt."
 
+    def _clear_kernel_caches(self):
+        # one of each per feature space, since the points (and kernels) differ between spaces
+        self.dist_caches = [_PairwiseCache() for d in self.unlabeled_datasets]
+        self.div_caches = [_PairwiseCache() for d in self.unlabeled_datasets]
+        # these are for single pairs, so are just dictionaries (see _compute_cos)
+        self.cos_caches = [{} for d in self.unlabeled_datasets]
+
+    def label_instances_in_all_datasets(self, inst_ids):
+        BaseLearner.label_instances_in_all_datasets(self, inst_ids)
+        # the distances/diversities are computed for unlabeled instances (rows) against the labeled
+        # set (columns), so the rows for the newly labeled instances won't be needed again
+        for cache in self.dist_caches + self.div_caches:
+            cache.drop_rows(inst_ids)
+
     def _get_dist_from_l(self, model, data, x):
-        min_dist = None
-        for y in data.instances:
-            if not (x.id, y.id) in self.dist_hash:
-                self.dist_hash[(x.id, y.id)] = model.compute_dist_between_examples(x.point, y.point)
-            if not min_dist or self.dist_hash[(x.id, y.id)] < min_dist:
-                min_dist = self.dist_hash[(x.id, y.id)]
-        return min_dist
+        ''' Returns the distance from x to the nearest instance in data (None if data is empty). '''
+        dists = self._cached_row(self.dist_caches, model, data, x, model.compute_dist_to_examples)
+        if not len(dists):
+            return None
+        return dists.min()
 
 
     def _compute_div(self, model, data, x):
-        sum = 0.0
-        for y in data.instances:
-            # have we already computed this?
-            if not (x.id, y.id) in self.div_hash:
-                # if not, compute the function and add to the hash
-                self.div_hash[(x.id, y.id)] = model.compute_cos_between_examples(x.point, y.point)
-            sum+= self.div_hash[(x.id, y.id)]
-        return sum
+        ''' Returns the sum of the cosines between x and each of the instances in data. '''
+        return self._cached_row(self.div_caches, model, data, x, model.compute_cos_to_examples).sum()
+
+
+    def _cached_row(self, caches, model, data, x, f):
+        '''
+        Returns f (a vectorized svm_model method) between x and each instance in data, going through
+        the cache (in caches) for model's feature space. If model isn't one of the current models
+        (e.g., it's been since rebuilt), the values are just computed.
+        '''
+        ys = data.instances.values()
+        for model_index, current_model in enumerate(self.models or []):
+            if current_model is model:
+                return caches[model_index].row(x, ys, _batched(f, data))
+        return numpy.array(_batched(f, data)(x, ys), dtype=float)
 
 
     def _compute_cos(self, model_index, x, y):
@@ -86,10 +142,13 @@ class BaseSVMLearner(BaseLearner):
         computes the cosine between two instances, x and y. note that this memoizes
         (caches) the cosine, to avoid redundant computation.
         '''
-        if not (model_index, x.id, y.id) in self.div_hash:
-            model = self.models[model_index]
-            self.div_hash[(model_index, x.id, y.id)] = model.compute_cos_between_examples(x.point, y.point)
-        return self.div_hash[(model_index, x.id, y.id)]
+        # the cosine is symmetric, so (x, y) and (y, x) share an entry
+        key = (x.id, y.id) if x.id <= y.id else (y.id, x.id)
+        cos = self.cos_caches[model_index].get(key)
+        if cos is None:
+            cos = self.models[model_index].compute_cos_between_examples(x.point, y.point)
+            self.cos_caches[model_index][key] = cos
+        return cos
         
     
     def _SIMPLE(self, model, unlabeled_dataset, k):  
@@ -104,32 +163,11 @@ class BaseSVMLearner(BaseLearner):
         Hence we make it more accessible by defining it at the base_svm_learner
         level.
         '''    
-        # initially assume k first examples are closest
-        k_ids_to_distances = {}
-        for x in unlabeled_dataset.instances.values()[:k]:
-            k_ids_to_distances[x.id] = model.distance_to_hyperplane(x.point)
-
-        # now iterate over the rest
-        for x in unlabeled_dataset.instances.values()[k:]:
-            cur_max_id, cur_max_dist = self._get_max_val_key_tuple(k_ids_to_distances)
-            x_dist = model.distance_to_hyperplane(x.point)
-            if x_dist < cur_max_dist:
-                # then x is closer to the hyperplane than the farthest currently observed
-                # remove current max entry from the dictionary
-                k_ids_to_distances.pop(cur_max_id)
-                k_ids_to_distances[x.id] = x_dist
-
-        return k_ids_to_distances.keys()        
-
-
-    def _get_max_val_key_tuple(self, d):
-        keys, values = d.keys(), d.values()
-        max_key, max_val = keys[0], values[0]
-        for key, value in zip(keys[1:], values[1:]):
-            if value > max_val:
-                max_key = key
-                max_val = value
-        return (max_key, max_val)
+        distance_to_hyperplane = model.distance_to_hyperplane
+        instances = unlabeled_dataset.instances.values()
+        distances = numpy.array([distance_to_hyperplane(x.point) for x in instances])
+        # the k instances closest to the hyperplane, i.e., with the largest negated distances
+        return [instances[i].id for i in self._top_k(-distances, k)]
         
         
     def aggressive_undersample_labeled_datasets(self, k=None):
@@ -139,15 +177,18 @@ class BaseSVMLearner(BaseLearner):
         '''
         feature_space_index = 0
         if self.labeled_datasets and len(self.labeled_datasets) and (len(self.labeled_datasets[0].instances) > 0):
+            # count each class once; each count is a pass over the labeled data
+            num_minority = self.labeled_datasets[0].number_of_minority_examples()
+            num_majority = len(self.labeled_datasets[0]) - num_minority
             if not k:
                 print "(aggressively) undersampling majority class to equal that of the minority examples"
                 # we have to include 'false' minorities -- i.e., instances we've assumed are positives -- because otherwise we'd be cheating
-                k = self.labeled_datasets[feature_space_index].number_of_majority_examples() - self.labeled_datasets[0].number_of_minority_examples()
+                k = num_majority - num_minority
             # we copy the datasets rather than mutate the class members.
             copied_datasets = [d.copy() for d in self.labeled_datasets]
-            if k < self.labeled_datasets[0].number_of_majority_examples() and k > 0:
+            if k < num_majority and k > 0:
                 print "removing %s majority instances. there are %s total majority examples in the dataset." % \
-                                    (k, self.labeled_datasets[0].number_of_majority_examples())
+                                    (k, num_majority)
 
                 # get the majority examples; find those closeset to the hyperplane (via the SIMPLE method)
                 # and return them.
@@ -162,4 +203,72 @@ class BaseSVMLearner(BaseLearner):
         else:
             raise Exception, "No labeled data has been provided!"   
         return copied_datasets
-        
\ No newline at end of file
+
+
+def _train_model((problem, param)):
+    return svm_model(problem, param)
+
+
+def _batched(f, data):
+    '''
+    Adapts f -- one of the vectorized svm_model methods, e.g., compute_cos_to_examples -- to 
+    the f(x, ys) signature _PairwiseCache expects, drawing the ys' points from the dense
+    point matrix of data (all ys are assumed to be in data).
+    '''
+    X, sq_norms, row_for_id = data.get_point_matrix()
+    def f_many(x, ys):
+        rows = [row_for_id[y.id] for y in ys]
+        return f(x.point, X[rows], sq_norms[rows])
+    return f_many
+
+
+class _PairwiseCache(object):
+    '''
+    Memoizes a pairwise function between instances in a dense matrix. Rows
+    and columns are assigned (on first sight) to instance ids, and entries that have yet to
+    be computed are NaN. The column space grows with the labeled set, so this stays far
+    smaller than an all-pairs matrix over the unlabeled pool. Rows that are no longer needed
+    can be dropped; their storage is then reused for new rows.
+    '''
+    def __init__(self):
+        self.row_index, self.col_index = {}, {}
+        self.free_rows = []
+        self.values = numpy.empty((0, 0))
+
+    def row(self, x, ys, f):
+        ''' 
+        Returns an array holding the value for x against each y in ys. Missing entries are 
+        computed with a single call to f(x, missing_ys), which returns a sequence of values.
+        '''
+        if x.id not in self.row_index and self.free_rows:
+            self.row_index[x.id] = self.free_rows.pop()
+        i = self._index(self.row_index, x.id)
+        js = numpy.array([self._index(self.col_index, y.id) for y in ys], dtype=numpy.intp)
+        self._grow()
+        vals = self.values[i, js]
+        missing = numpy.flatnonzero(numpy.isnan(vals))
+        if len(missing):
+            vals[missing] = self.values[i, js[missing]] = f(x, [ys[m] for m in missing])
+        return vals
+
+    def drop_rows(self, inst_ids):
+        ''' Forgets the rows (if any) for the given instance ids. '''
+        rows = [self.row_index.pop(inst_id) for inst_id in inst_ids if inst_id in self.row_index]
+        self.values[rows] = numpy.nan
+        self.free_rows.extend(rows)
+
+    def _index(self, index, inst_id):
+        if inst_id not in index:
+            index[inst_id] = len(index)
+        return index[inst_id]
+
+    def _grow(self):
+        n_rows, n_cols = self.values.shape
+        if len(self.row_index) > n_rows or len(self.col_index) > n_cols:
+            # double (only) the dimension(s) that ran out, to amortize the copy
+            shape = [n if len(index) <= n else max(len(index), 2*n)
+                        for n, index in ((n_rows, self.row_index), (n_cols, self.col_index))]
+            grown = numpy.empty(shape)
+            grown.fill(numpy.nan)
+            grown[:n_rows, :n_cols] = self.values
+            self.values = grown
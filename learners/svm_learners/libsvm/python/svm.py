@@ -135,8 +135,55 @@ def _convert_to_svm_node_array(x, keep_zeros = True):
         j = j + 1
     return data
 
+def _to_dense(x, width):
+    '''
+    Returns x (a mapping or sequence) as a dense numpy vector of the given width, along with
+    its squared norm taken over *all* of its dimensions (including those beyond width).
+    '''
+    x_vec = numpy.zeros(width)
+    if type(x) == dict:
+        items = x.items()
+    else:
+        items = enumerate(x)
+    sq_norm = 0.0
+    for k, v in items:
+        sq_norm += v*v
+        if k < width:
+            x_vec[k] = v
+    return x_vec, sq_norm
+
+def _maxlen(x):
+    if type(x) == dict:
+        if (len(x) > 0):
+            return max(x.keys())
+        return 0
+    return len(x)
+
+class svm_node_cache:
+    '''
+    Holds svm_node arrays for points, keyed by (e.g.) instance ids, so that a point is converted
+    only once no matter how many problems it goes into. Problems built over the cache keep a 
+    reference to it; the arrays are freed along with the cache.
+    '''
+    def __init__(self):
+        self.arrays = {}
+        self.maxlens = {}
+
+    def get(self, key, x):
+        if key not in self.arrays:
+            self.arrays[key] = _convert_to_svm_node_array(x)
+            self.maxlens[key] = _maxlen(x)
+        return self.arrays[key], self.maxlens[key]
+
+    def __del__(self):
+        for data in self.arrays.values():
+            svmc.svm_node_array_destroy(data)
+
 class svm_problem:
-    def __init__(self,y,x):
+    def __init__(self,y,x,node_cache=None,keys=None):
+        '''
+        If a node_cache is given, the (converted) points are taken from it, keys[i] being the key for x[i].
+        '''
         assert len(y) == len(x)
         self.prob = prob = svmc.new_svm_problem()
         self.size = size = len(y)
@@ -146,17 +193,17 @@ class svm_problem:
             svmc.double_setitem(y_array,i,y[i])
         
         self.x_matrix = x_matrix = svmc.svm_node_matrix(size)
+        self.node_cache = node_cache
         self.data = []
         self.maxlen = 0;
         for i in range(size):
-            data = _convert_to_svm_node_array(x[i])
-            self.data.append(data);
-            svmc.svm_node_matrix_set(x_matrix,i,data)
-            if type(x[i]) == dict:
-                if (len(x[i]) > 0):
-                    self.maxlen = max(self.maxlen,max(x[i].keys()))
+            if node_cache is None:
+                data, maxlen = _convert_to_svm_node_array(x[i]), _maxlen(x[i])
+                self.data.append(data);
             else:
-                self.maxlen = max(self.maxlen,len(x[i]))
+                data, maxlen = node_cache.get(keys[i], x[i])
+            svmc.svm_node_matrix_set(x_matrix,i,data)
+            self.maxlen = max(self.maxlen,maxlen)
         
         svmc.svm_problem_l_set(prob,size)
         svmc.svm_problem_y_set(prob,y_array)
@@ -168,8 +215,9 @@ class svm_problem:
     def __del__(self):
         svmc.delete_svm_problem(self.prob)
         svmc.delete_double(self.y_array)
-        for i in range(self.size):
-            svmc.svm_node_array_destroy(self.data[i])
+        # (node arrays taken from a node_cache belong to it)
+        for data in self.data:
+            svmc.svm_node_array_destroy(data)
         svmc.svm_node_matrix_destroy(self.x_matrix)
 
 class svm_model:
@@ -179,6 +227,7 @@ class svm_model:
             # create model from file
             filename = arg1
             self.model = svmc.svm_load_model(filename)
+            self.kernel = None
         else:
             # create model from problem and parameter
             prob,param = arg1,arg2
@@ -188,6 +237,8 @@ class svm_model:
             msg = svmc.svm_check_parameter(prob.prob,param.param)
             if msg: raise ValueError, msg
             self.model = svmc.svm_train(prob.prob,param.param)
+            # snapshot the kernel settings (svm_train copies them into the model) for k_function_many
+            self.kernel = (param.kernel_type, param.degree, param.gamma, param.coef0)
         
         #setup some classwide variables
         self.nr_class = svmc.svm_get_nr_class(self.model)
@@ -199,6 +250,10 @@ class svm_model:
         svmc.delete_int(intarr)
         #check if valid probability model
         self.probability = svmc.svm_check_probability_model(self.model)
+        # decision values buffer, reused across calls to predict_values_raw (which are
+        # made once per unlabeled instance by, e.g., distance_to_hyperplane)
+        self.n_dec_values = self.nr_class*(self.nr_class-1)/2
+        self.dec_values = svmc.new_double(self.n_dec_values)
         
     def predict(self,x):
         data = _convert_to_svm_node_array(x)
@@ -228,13 +283,10 @@ class svm_model:
         return self.labels
     
     def predict_values_raw(self,x):
-        #convert x into svm_node, allocate a double array for return
-        n = self.nr_class*(self.nr_class-1)/2
+        #convert x into svm_node; the decision values are written to the preallocated buffer
         data = _convert_to_svm_node_array(x)
-        dblarr = svmc.new_double(n)
-        svmc.svm_predict_values(self.model, data, dblarr)
-        ret = _double_array_to_list(dblarr, n)
-        svmc.delete_double(dblarr)
+        svmc.svm_predict_values(self.model, data, self.dec_values)
+        ret = _double_array_to_list(self.dec_values, self.n_dec_values)
         svmc.svm_node_array_destroy(data)
         return ret
     
@@ -308,10 +360,65 @@ class svm_model:
         svmc.svm_node_array_destroy(b)
         return k_val
         
+    def k_function_many(self, a, B, B_sq_norms=None):
+        '''
+        Evaluates the kernel between the point a (a mapping or sequence) and each row of the dense
+        matrix B at once. Every built-in kernel is a function of the inner products and (squared)
+        norms of its arguments, so this amounts to a single matrix-vector product. Columns of B are
+        dimensions; dimensions of a beyond B's width don't touch the inner products (only |a|^2).
+        '''
+        if self.kernel is None or self.kernel[0] == PRECOMPUTED:
+            # kernel settings unknown (model loaded from file); fall back to one call per row
+            return numpy.array([self.k_function(a, b) for b in B])
+        a_vec, a_sq = _to_dense(a, B.shape[1])
+        if B_sq_norms is None:
+            B_sq_norms = (B*B).sum(axis=1)
+        kernel_type, degree, gamma, coef0 = self.kernel
+        dots = numpy.dot(B, a_vec)
+        if kernel_type == LINEAR:
+            return dots
+        elif kernel_type == POLY:
+            return (gamma*dots + coef0)**degree
+        elif kernel_type == RBF:
+            return numpy.exp(-gamma*(a_sq + B_sq_norms - 2*dots))
+        return numpy.tanh(gamma*dots + coef0)
+
+    def compute_cos_to_examples(self, a, B, B_sq_norms=None):
+        ''' Vectorized compute_cos_between_examples, between a and each row of B. '''
+        if B_sq_norms is None:
+            B_sq_norms = (B*B).sum(axis=1)
+        k_ab = self.k_function_many(a, B, B_sq_norms)
+        k_aa = self.k_function(a, a)
+        k_bb = self._k_self_many(B, B_sq_norms)
+        denom = numpy.sqrt(k_aa * k_bb)
+        # as in the scalar version, the cosine is taken to be 0 if either point has zero 'length'
+        return numpy.where(denom == 0, 0.0, numpy.abs(k_ab) / numpy.where(denom == 0, 1.0, denom))
+
+    def compute_dist_to_examples(self, a, B, B_sq_norms=None):
+        ''' Vectorized compute_dist_between_examples, between a and each row of B. '''
+        if B_sq_norms is None:
+            B_sq_norms = (B*B).sum(axis=1)
+        k_ab = self.k_function_many(a, B, B_sq_norms)
+        return numpy.sqrt(self.k_function(a, a) + self._k_self_many(B, B_sq_norms) + 2 * k_ab)
+
+    def _k_self_many(self, B, B_sq_norms):
+        ''' k(b, b) for each row b of B '''
+        if self.kernel is None or self.kernel[0] == PRECOMPUTED:
+            return numpy.array([self.k_function(b, b) for b in B])
+        kernel_type, degree, gamma, coef0 = self.kernel
+        if kernel_type == LINEAR:
+            return B_sq_norms
+        elif kernel_type == POLY:
+            return (gamma*B_sq_norms + coef0)**degree
+        elif kernel_type == RBF:
+            return numpy.ones(len(B_sq_norms))
+        return numpy.tanh(gamma*B_sq_norms + coef0)
+        
     def save(self,filename):
         svmc.svm_save_model(filename,self.model)
     
     def __del__(self):
+        svmc.delete_double(self.dec_values)
         svmc.svm_destroy_model(self.model)
 
 
@@ -34,6 +34,12 @@ struct svm_problem
 	struct svm_node **x;
 };
 
+/* training only touches the (C-side) problem and parameter, so let other python threads run meanwhile */
+%exception svm_train {
+	Py_BEGIN_ALLOW_THREADS
+	$action
+	Py_END_ALLOW_THREADS
+}
 struct svm_model *svm_train(const struct svm_problem *prob, const struct svm_parameter *param);
 
 void svm_cross_validation(const struct svm_problem *prob, const struct svm_parameter *param, int nr_fold, double *target);
@@ -3921,7 +3921,11 @@ SWIGINTERN PyObject *_wrap_svm_train(PyObject *SWIGUNUSEDPARM(self), PyObject *a
     SWIG_exception_fail(SWIG_ArgError(res2), "in method '" "svm_train" "', argument " "2"" of type '" "struct svm_parameter const *""'"); 
   }
   arg2 = (struct svm_parameter *)(argp2);
-  result = (struct svm_model *)svm_train((struct svm_problem const *)arg1,(struct svm_parameter const *)arg2);
+  {
+    Py_BEGIN_ALLOW_THREADS
+    result = (struct svm_model *)svm_train((struct svm_problem const *)arg1,(struct svm_parameter const *)arg2);
+    Py_END_ALLOW_THREADS
+  }
   resultobj = SWIG_NewPointerObj(SWIG_as_voidptr(result), SWIGTYPE_p_svm_model, 0 |  0 );
   return resultobj;
 fail:
@@ -35,11 +35,12 @@ class PALLearner(SimpleLearner):
             self.diversity_scores = [[] for d in self.unlabeled_datasets]
             self.observed_minorities = [[] for d in self.unlabeled_datasets]
         
-        def active_learn(self, num_examples_to_label, batch_size=5):
+        def active_learn(self, num_examples_to_label, batch_size=5, rebuild_every=None, rebuild_in_background=False):
             #
             # call the base active learn method
             #
-            BaseLearner.active_learn(self, num_examples_to_label, batch_size=batch_size)
+            BaseLearner.active_learn(self, num_examples_to_label, batch_size=batch_size, rebuild_every=rebuild_every,
+                                        rebuild_in_background=rebuild_in_background)
             labeled_so_far = len(self.labeled_datasets[0])
             N = labeled_so_far + len(self.unlabeled_datasets[0])
             if not self.switched_to_exploit and labeled_so_far >= self.label_at_least * N:
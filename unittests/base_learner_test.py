@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+# first resolve path/imports.
+base_path = os.path.abspath('..')
+sys.path.append(base_path)
+sys.path.append(os.path.join(base_path, "learners"))
+import learners.base_learner as base_learner
+import dataset
+
+class StubModel:
+    ''' Predicts the label stored for each example (examples here are just keys). '''
+    def __init__(self, labels):
+        self.labels = labels
+
+    def predict(self, x):
+        return self.labels[x]
+
+class TestBaseLearner(unittest.TestCase):
+    def setUp(self):
+        self.learner = base_learner.BaseLearner([])
+        # three models (feature spaces) voting on five examples; example 4 is a tie between -1 and 1
+        self.learner.models = [StubModel({0:-1.0, 1:1.0, 2:1.0, 3:-1.0, 4:-1.0}),
+                               StubModel({0:-1.0, 1:1.0, 2:-1.0, 3:1.0, 4:1.0}),
+                               StubModel({0:1.0, 1:1.0, 2:1.0, 3:-1.0, 4:0.0})]
+        self.X_list = [[i]*3 for i in range(5)]
+
+    def test1_predict_batch_agrees_with_majority_predict(self):
+        expected = [self.learner.majority_predict(X) for X in self.X_list]
+        predictions = self.learner.predict_batch(self.X_list)
+        self.assertEqual(predictions, expected)
+        self.assertEqual(predictions[:4], [-1, 1, 1, -1])
+        # ties go to the smallest label, in both
+        self.assertEqual(predictions[4], -1)
+        # just two models: now every example but the first two is a tie
+        self.learner.models = self.learner.models[:2]
+        self.assertEqual(self.learner.predict_batch(self.X_list),
+                            [self.learner.majority_predict(X) for X in self.X_list])
+        self.assertEqual(self.learner.predict_batch([]), [])
+
+    def test2_predict_batch_return_type(self):
+        self.learner.predict = self.learner.cautious_predict
+        for predictions in (self.learner.predict_batch(self.X_list),
+                                [self.learner.majority_predict(X) for X in self.X_list]):
+            self.assertTrue(all([type(p) == int for p in predictions]))
+
+    def test3_unlabel_instances(self):
+        instances = [dataset.Instance(i, {0:float(i)}, label=1.0) for i in range(4)]
+        learner = base_learner.BaseLearner([dataset.Dataset(instances=dict(zip(range(4), instances)))])
+        learner.label_instances([0, 1])
+        # 2 is still unlabeled and 7 doesn't exist; both are skipped
+        learner.unlabel_instances([1, 2, 7])
+        self.assertEqual(sorted(learner.labeled_datasets[0].get_instance_ids()), [0])
+        self.assertEqual(sorted(learner.unlabeled_datasets[0].get_instance_ids()), [1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
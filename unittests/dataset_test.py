@@ -36,6 +36,18 @@ class TestDataset(unittest.TestCase):
 
     def test4_UndersampleDataset(self):
         pass
+
+    def test5_PointMatrix(self):
+        ''' The dense point matrix should agree with the (sparse) points, and be rebuilt after removals '''
+        X, sq_norms, row_for_id = self.data.get_point_matrix()
+        self.assertEquals(len(X), self.data.size())
+        for inst_id in random.sample(self.data.get_instance_ids(), 20):
+            point = self.data.get_point_for_id(inst_id)
+            for dim, value in point.items():
+                self.assertEquals(X[row_for_id[inst_id], dim], value)
+            self.assertAlmostEquals(sq_norms[row_for_id[inst_id]], sum([v*v for v in point.values()]))
+        self.data.remove_instances(random.sample(self.data.get_instance_ids(), 20))
+        self.assertEquals(len(self.data.get_point_matrix()[0]), self.data.size())
     
 
         
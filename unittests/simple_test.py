@@ -1,6 +1,7 @@
 import os
 import sys
 import unittest
+import numpy
 # first resolve path/imports.
 # todo: the path resolution stuff is kind of hacky right now
 base_path = os.path.abspath('..')
@@ -32,6 +33,71 @@ class TestSimpleLearner(unittest.TestCase):
         learner.rebuild_models()
         learner.active_learn(1, batch_size=1)
         assert(2 in learner.labeled_datasets[0].get_instance_ids())
-        
+
+    def test2_cached_pairwise_values(self):
+        learner = simple_svm_learner.SimpleLearner([self.data])
+        learner.params = [svm_parameter(kernel_type = LINEAR)]
+        learner.label_instances([1,3])
+        learner.rebuild_models()
+        model, labeled = learner.models[0], learner.labeled_datasets[0]
+        x = self.data.instances[0]
+        expected_div = sum([model.compute_cos_between_examples(x.point, y.point) for y in labeled.instances.values()])
+        expected_dist = min([model.compute_dist_between_examples(x.point, y.point) for y in labeled.instances.values()])
+        # the second call of each is served from the cache
+        for i in range(2):
+            self.assertAlmostEqual(learner._compute_div(model, labeled, x), expected_div)
+            self.assertAlmostEqual(learner._get_dist_from_l(model, labeled, x), expected_dist)
+
+    def test3_top_k(self):
+        learner = simple_svm_learner.SimpleLearner([self.data])
+        scores = numpy.array([.3, .9, .1, .5, .7])
+        self.assertEqual(list(learner._top_k(scores, 3)), [1, 4, 3])
+        # asking for more than there are just returns them all
+        self.assertEqual(list(learner._top_k(scores, 10)), [1, 4, 3, 0, 2])
+        self.assertEqual(len(learner._top_k(scores, 0)), 0)
+
+    def test4_caches_are_per_feature_space(self):
+        # a second feature space over the same ids, with different points
+        instances = [dataset.Instance(i, {0:inst.point[1], 1:.1*inst.point[0]}, label=inst.label)
+                        for i, inst in sorted(self.data.instances.items())]
+        other_data = dataset.Dataset(instances=dict(zip(range(4), instances)))
+        learner = simple_svm_learner.SimpleLearner([self.data, other_data])
+        learner.params = [svm_parameter(kernel_type = LINEAR), svm_parameter(kernel_type = RBF)]
+        learner.label_instances([1,3])
+        learner.rebuild_models()
+        for model, labeled, unlabeled in zip(learner.models, learner.labeled_datasets, learner.unlabeled_datasets):
+            x = unlabeled.instances[0]
+            expected_div = sum([model.compute_cos_between_examples(x.point, y.point) for y in labeled.instances.values()])
+            expected_dist = min([model.compute_dist_between_examples(x.point, y.point) for y in labeled.instances.values()])
+            self.assertAlmostEqual(learner._compute_div(model, labeled, x), expected_div)
+            self.assertAlmostEqual(learner._get_dist_from_l(model, labeled, x), expected_dist)
+
+    def test5_rebuild_in_background(self):
+        # two feature spaces over 20 points
+        random_state = numpy.random.RandomState(0)
+        points = random_state.rand(20, 2)
+        datasets = []
+        for f in (lambda p: p, lambda p: (p[1], .5*p[0])):
+            instances = [dataset.Instance(i, dict(enumerate(f(p))), label=(1.0 if p[0] > p[1] else -1.0))
+                            for i, p in enumerate(points)]
+            datasets.append(dataset.Dataset(instances=dict(zip(range(20), instances))))
+        learner = simple_svm_learner.SimpleLearner(datasets)
+        learner.params = [svm_parameter(kernel_type = LINEAR), svm_parameter(kernel_type = RBF)]
+        labels = [inst.label for inst in datasets[0].instances.values()]
+        learner.label_instances([labels.index(1.0), labels.index(-1.0)])
+        learner.rebuild_models()
+        learner.active_learn(8, batch_size=2, rebuild_in_background=True)
+
+        self.assertEqual(learner.labeled_datasets[0].size(), 10)
+        background_models = learner.models
+        for model, labeled in zip(background_models, learner.labeled_datasets):
+            self.assertEqual(model.prob.size, labeled.size())
+        # the models should be the same as those built (here) over the final labeled datasets
+        learner.rebuild_models()
+        for background_model, model, unlabeled in zip(background_models, learner.models, learner.unlabeled_datasets):
+            for x in unlabeled.instances.values():
+                self.assertAlmostEqual(background_model.predict_values_raw(x.point)[0],
+                                            model.predict_values_raw(x.point)[0])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file